@@ -19,30 +19,45 @@ Requisitos mínimos sugeridos en requirements.txt (compatibles con Streamlit Clo
 """
 
 import os
+import re
+import json
+import hashlib
+import logging
 import math
-from typing import Dict, List, Tuple, Optional
+import codecs
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Tuple, Optional
 
 import numpy as np
 import pandas as pd
+from pandas.api.types import union_categoricals
 import streamlit as st
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
+logger = logging.getLogger(__name__)
+
 # -----------------------------------------------------------------------------
 # Configuración de página e ícono
 # -----------------------------------------------------------------------------
 _IMG_ICON_PATH = "inegi.png"
-_icon = None
-if os.path.exists(_IMG_ICON_PATH):
-    try:
-        from PIL import Image
-        _icon = Image.open(_IMG_ICON_PATH)
-    except Exception:
-        _icon = "📊"
-else:
-    _icon = "📊"
 
-st.set_page_config(page_title="Demografía de Negocios — FULL", page_icon=_icon, layout="wide")
+
+@st.cache_resource(show_spinner=False)
+def _icono_pagina():
+    """Ícono decodificado una sola vez por proceso (el script se re-ejecuta en cada interacción)."""
+    if os.path.exists(_IMG_ICON_PATH):
+        try:
+            from PIL import Image
+            with Image.open(_IMG_ICON_PATH) as img:
+                return img.copy()  # copia en memoria: el archivo se cierra al salir
+        except Exception:
+            pass
+    return "📊"
+
+
+st.set_page_config(page_title="Demografía de Negocios — FULL", page_icon=_icono_pagina(), layout="wide")
 st.title("Simulador de Indicadores Demográficos Económicos de México — Versión FULL")
 
 # -----------------------------------------------------------------------------
@@ -59,6 +74,27 @@ MAPEO_ARCHIVOS: Dict[str, int] = {
     "NAC_UE_POT_SEC_8.csv": 2023,
 }
 PROBABILIDADES_FILE = "PROBABILIDADES.csv"
+# Copia binaria (columnar, ya tipada) del DataFrame unificado; se regenera si algún CSV es más reciente
+CENSOS_PARQUET = "censos_unificado.parquet"
+# Versión del formato de la copia: subirla al cambiar la lectura, la normalización o los dtypes,
+# para que las copias escritas por una versión anterior se regeneren
+CENSOS_PARQUET_VERSION = 1
+_FIRMA_PARQUET_CLAVE = b"seirn_firma"
+
+# Cabecera normalizada (mayúsculas, "_" por espacios) -> nombre interno
+CABECERAS_CENSO = {
+    "ENTIDAD": "entidad",
+    "SECTOR": "sector",
+    "TAMAÑO": "personal_ocupado_estrato",
+    "UNIDADES_ECONÓMICAS": "ue",
+    "AÑO": "generacion",
+    "PERSONAL_OCUPADO": "po",
+}
+# dtype declarado al leer; las columnas numéricas se siguen infiriendo porque pueden traer texto
+# que _normalize_columns convierte a NaN/0
+TIPOS_CENSO = {"ENTIDAD": "category", "SECTOR": "category"}
+
+FENOMENOS = ("Población activa", "Natalidad", "Supervivencia")
 
 # Mapa etiqueta ↔︎ estrato
 ESTRATO_ETIQUETA_A_NUM = {
@@ -73,46 +109,154 @@ ESTRATO_ETIQUETA_A_NUM = {
     "101 y más Personas ocupadas": 9,
 }
 NUM_A_ETIQUETA_ESTRATO = {v: k for k, v in ESTRATO_ETIQUETA_A_NUM.items()}
+# Etiqueta → (estrato, abierto): "y más" incluye ese estrato y los superiores; se resuelve una vez
+ESTRATO_FILTRO: Dict[str, Tuple[int, bool]] = {
+    etiqueta: (num, "y más" in etiqueta) for etiqueta, num in ESTRATO_ETIQUETA_A_NUM.items()
+}
 
-TASAS_IMSS = [1.0184, 0.9681, 1.0558, 1.0319]  # 2019..2022
+TASAS_IMSS = np.array([1.0184, 0.9681, 1.0558, 1.0319])  # 2019..2022
+ANIOS_IMSS = np.arange(2019, 2019 + len(TASAS_IMSS))
+
+# Color de cada serie graficada: métricas de negocios (UE) en verde azulado; el resto (PO) en azul
+COLOR_PO = "#003057"
+COLORES_SERIES: Dict[str, str] = {
+    "Número de Negocios": "#08989C",
+    "Número de Nacimientos": "#08989C",
+    **{f"Supervivientes después de {step} años UE": "#08989C" for step in (5, 10, 15, 20, 25)},
+}
+
+# Plantilla Plotly compartida: leyenda, márgenes, hover y ejes comunes a todas las gráficas.
+# Se registra una sola vez por proceso y se compone sobre la plantilla "streamlit".
+# El tamaño del título no va aquí: el tema de st.plotly_chart reescribe title.font.size de la
+# plantilla (ver TITULO_FIG_FUENTE).
+if "seirn" not in pio.templates:
+    pio.templates["seirn"] = go.layout.Template(
+        layout=dict(
+            hovermode="x unified",
+            legend=dict(x=0.5, xanchor="center", y=-0.2, yanchor="top", orientation="h"),
+            margin=dict(t=110),
+            # Separador de miles en los ejes (aplica a todos los ejes Y, incluido el secundario)
+            yaxis=dict(tickformat=","),
+        )
+    )
+    pio.templates.default = "streamlit+seirn"
+
+# Fuente del título de cada figura (en el layout propio, que el tema de Streamlit no toca)
+TITULO_FIG_FUENTE = dict(size=15)
 
 # -----------------------------------------------------------------------------
 # Utilidades E/S
 # -----------------------------------------------------------------------------
 
-def _auto_sep_read_csv(path: str) -> pd.DataFrame:
+_ESPACIOS = re.compile(r"\s+")
+
+
+def _normalizar_cabecera(col: str) -> str:
+    # Cualquier racha de espacios/tabuladores internos cuenta como un solo "_"
+    return _ESPACIOS.sub("_", col.strip()).upper()
+
+
+def _detectar_codificacion(path: str, muestra: int = 65536) -> str:
+    """BOM o UTF-8 válido en los primeros 64 KB; si no, latin1 (formato histórico de los CSV)."""
+    with open(path, "rb") as f:
+        raw = f.read(muestra)
+    if raw.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
     try:
-        df = pd.read_csv(path, sep=None, engine="python", encoding="latin1", low_memory=False)
-        return df
+        # Decodificador incremental: un carácter multibyte cortado al final de la muestra no es error
+        codecs.getincrementaldecoder("utf-8")().decode(raw, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def _columnas_binarias(df: pd.DataFrame) -> bool:
+    """True si alguna columna de texto trae bytes: pyarrow los deja así al no poder decodificar UTF-8
+    (toda la columna pasa a binaria, basta mirar un valor)."""
+    for col in df.columns:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            valores = s.cat.categories.to_numpy()
+        elif s.dtype == object:
+            valores = s.dropna().to_numpy()
+        else:
+            continue
+        if len(valores) and isinstance(valores[0], bytes):
+            return True
+    return False
+
+
+def _leer_csv(path: str, encoding: str, columnas: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+    """Lee el CSV con la codificación dada, eligiendo el separador por la cabecera.
+    Se lee solo la primera línea para elegir el separador (sep=None obliga al motor Python, mucho
+    más lento en archivos grandes). `columnas` (cabecera normalizada -> dtype o None) limita el
+    parseo a esas columnas.
+    """
+    with open(path, "r", encoding=encoding, newline="") as f:
+        cabecera = f.readline()
+        sep = max((",", ";", "\t", "|"), key=cabecera.count)
+        f.seek(0)
+        if columnas is None:
+            return pd.read_csv(f, sep=sep, low_memory=False)
+        usecols, dtype = [], {}
+        for col in (c.strip('"') for c in cabecera.rstrip("\r\n").split(sep)):
+            norm = _normalizar_cabecera(col)
+            if norm in columnas:
+                usecols.append(col)
+                if columnas[norm] is not None:
+                    dtype[col] = columnas[norm]
+    # Lector multihilo de Arrow (pyarrow llega como dependencia de streamlit). Si falta, o si rechaza
+    # el archivo (es más estricto que el motor C: filas cortas, coma final...), se usa el motor C
+    try:
+        return pd.read_csv(path, sep=sep, encoding=encoding, usecols=usecols, dtype=dtype, engine="pyarrow")
     except Exception:
-        return pd.read_csv(path, sep=",", encoding="latin1", low_memory=False)
+        return pd.read_csv(path, sep=sep, encoding=encoding, usecols=usecols, dtype=dtype, low_memory=False)
+
+
+def _auto_sep_read_csv(path: str, columnas: Optional[Dict[str, Optional[str]]] = None) -> pd.DataFrame:
+    """Lee un CSV detectando codificación y separador.
+    La codificación sale de una muestra (_detectar_codificacion), que no garantiza el resto del
+    archivo: si la lectura como UTF-8 falla o deja columnas en bytes, se relee como latin1.
+    """
+    encoding = _detectar_codificacion(path)
+    try:
+        df = _leer_csv(path, encoding, columnas)
+    except UnicodeDecodeError:
+        if encoding == "latin1":
+            raise
+        return _leer_csv(path, "latin1", columnas)
+    if encoding != "latin1" and _columnas_binarias(df):
+        return _leer_csv(path, "latin1", columnas)
+    return df
+
+
+def _categoria_normalizada(s: pd.Series) -> pd.Categorical:
+    """Mayúsculas/sin espacios sobre las etiquetas únicas, no fila por fila.
+    Etiquetas que colapsan al normalizar (p. ej. 'Sonora' y 'SONORA ') comparten código."""
+    s = s.astype("category")
+    limpias, inversa = np.unique(s.cat.categories.astype(str).str.upper().str.strip(), return_inverse=True)
+    codigos = s.cat.codes.to_numpy()
+    return pd.Categorical.from_codes(np.where(codigos >= 0, inversa[codigos], -1), categories=limpias)
 
 
 def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Normalización y renombrado de cabeceras en una sola pasada sobre el índice
     df = df.copy()
-    df.columns = [c.upper().strip().replace(" ", "_") for c in df.columns]
-    ren = {
-        "ENTIDAD": "entidad",
-        "SECTOR": "sector",
-        "TAMAÑO": "personal_ocupado_estrato",
-        "UNIDADES_ECONÓMICAS": "ue",
-        "AÑO": "generacion",
-        "PERSONAL_OCUPADO": "po",
-    }
-    for k, v in ren.items():
-        if k in df.columns:
-            df.rename(columns={k: v}, inplace=True)
-    if "entidad" in df.columns:
-        df["entidad"] = df["entidad"].astype(str).str.upper().str.strip()
-    if "sector" in df.columns:
-        df["sector"] = df["sector"].astype(str).str.upper().str.strip()
+    df.columns = [CABECERAS_CENSO.get(c, c) for c in map(_normalizar_cabecera, df.columns)]
+    for col in ("entidad", "sector"):
+        if col in df.columns:
+            df[col] = _categoria_normalizada(df[col])
     for col in ("ue", "po"):
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
     if "personal_ocupado_estrato" in df.columns:
         df["personal_ocupado_estrato"] = pd.to_numeric(df["personal_ocupado_estrato"], errors="coerce")
     if "generacion" in df.columns:
-        df["generacion"] = pd.to_numeric(df["generacion"], errors="coerce").fillna(0).astype("int32")
+        gen = df["generacion"]
+        # Entero NumPy (sin nulos posibles): un solo cast; texto o vacíos pasan por la coerción a 0
+        if not (isinstance(gen.dtype, np.dtype) and gen.dtype.kind in "iu"):
+            gen = pd.to_numeric(gen, errors="coerce").fillna(0)
+        df["generacion"] = gen.astype("int32")
     # Filas clave no nulas
     claves = [c for c in ("entidad", "sector", "personal_ocupado_estrato") if c in df.columns]
     if claves:
@@ -120,28 +264,112 @@ def _normalize_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-@st.cache_data(show_spinner=False)
+def _firma_censos(existentes: List[Tuple[str, int]]) -> str:
+    """Sello de la copia Parquet: versión del formato y, por CSV, año de censo, mtime y tamaño.
+    Cualquier CSV nuevo, modificado o eliminado (o un cambio de versión) la invalida.
+    """
+    archivos = {}
+    for archivo, anio_censo in existentes:
+        st_ = os.stat(archivo)
+        archivos[archivo] = [anio_censo, st_.st_mtime_ns, st_.st_size]
+    return json.dumps({"version": CENSOS_PARQUET_VERSION, "archivos": archivos}, sort_keys=True)
+
+
+def _leer_parquet_vigente(firma: str) -> Optional[pd.DataFrame]:
+    """La copia Parquet si su sello coincide con `firma`; None si no existe, es de otra versión
+    o de otros CSV, o no se puede leer (esto último queda en el log)."""
+    if not os.path.exists(CENSOS_PARQUET):
+        return None
+    try:
+        import pyarrow.parquet as pq
+        metadata = pq.read_schema(CENSOS_PARQUET).metadata or {}
+        if metadata.get(_FIRMA_PARQUET_CLAVE, b"").decode("utf-8") != firma:
+            return None
+        return pd.read_parquet(CENSOS_PARQUET)
+    except Exception:
+        logger.warning("Copia Parquet ilegible (%s); se reconstruye desde los CSV", CENSOS_PARQUET, exc_info=True)
+        return None
+
+
+def _escribir_parquet(df: pd.DataFrame, firma: str) -> None:
+    """Guarda la copia Parquet con su sello en los metadatos del esquema."""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        tabla = pa.Table.from_pandas(df, preserve_index=False)
+        tabla = tabla.replace_schema_metadata({**(tabla.schema.metadata or {}), _FIRMA_PARQUET_CLAVE: firma.encode("utf-8")})
+        pq.write_table(tabla, CENSOS_PARQUET, compression="zstd")
+    except Exception:
+        # p. ej. sistema de archivos de solo lectura: se sigue sin copia en disco
+        logger.warning("No se pudo escribir la copia Parquet %s", CENSOS_PARQUET, exc_info=True)
+
+
+def _cargar_censo(archivo: str, anio_censo: int) -> pd.DataFrame:
+    """Lee y normaliza un archivo de censo, etiquetado con su año."""
+    # Solo las columnas que usa la app; el resto del archivo no se materializa
+    dfi = _normalize_columns(_auto_sep_read_csv(archivo, {c: TIPOS_CENSO.get(c) for c in CABECERAS_CENSO}))
+    # dtypes finales ya por archivo: concat escribe una sola vez la salida, sin casts posteriores
+    if "personal_ocupado_estrato" in dfi.columns:
+        dfi["personal_ocupado_estrato"] = dfi["personal_ocupado_estrato"].astype("Int8")
+    dfi["censo"] = pd.Series(int(anio_censo), index=dfi.index, dtype="Int16")
+    return dfi
+
+
+def _ordenar_por_claves(df: pd.DataFrame) -> pd.DataFrame:
+    """Orden físico (entidad, sector, censo): los filtros por entidad/sector se vuelven cortes contiguos."""
+    claves = [c for c in ("entidad", "sector", "censo") if c in df.columns]
+    return df.sort_values(claves, kind="stable", ignore_index=True) if claves else df
+
+
+def _sello(firma: str) -> str:
+    """Identidad corta de los datos cargados (misma versión y mismos CSV -> mismo sello)."""
+    return hashlib.sha1(firma.encode("utf-8")).hexdigest()[:16]
+
+
+def sello_datos(df: pd.DataFrame) -> str:
+    """Sello del DataFrame de cargar_censos_unificado. Va en la clave de toda caché derivada de él
+    (mapas del sidebar, subconjuntos, pivotes, figuras en sesión), que así se invalida junto con
+    los datos si estos se recargan."""
+    return df.attrs.get("sello", "")
+
+
+# Recurso compartido y de solo lectura: st.cache_data copiaría (pickle) el DataFrame completo en
+# cada rerun. Nadie lo modifica en sitio; los filtros devuelven vistas/copias nuevas.
+@st.cache_resource(show_spinner=False)
 def cargar_censos_unificado() -> pd.DataFrame:
-    dfs = []
+    # Los avisos se emiten en el hilo del script; los hilos del pool no tienen contexto de Streamlit.
+    # Se revisan antes de usar la copia Parquet para que un CSV faltante siempre se avise.
+    existentes = []
     for archivo, anio_censo in MAPEO_ARCHIVOS.items():
-        if not os.path.exists(archivo):
+        if os.path.exists(archivo):
+            existentes.append((archivo, anio_censo))
+        else:
             st.warning(f"Archivo no encontrado: {archivo}")
-            continue
-        dfi = _auto_sep_read_csv(archivo)
-        dfi = _normalize_columns(dfi)
-        dfi["censo"] = int(anio_censo)
-        dfs.append(dfi)
-    if not dfs:
+    if not existentes:
         return pd.DataFrame()
+    # Arranque en frío: la copia Parquet evita volver a parsear y normalizar los CSV
+    firma = _firma_censos(existentes)
+    df = _leer_parquet_vigente(firma)
+    if df is not None:
+        df.attrs["sello"] = _sello(firma)
+        return df
+    # Lectura concurrente: los parsers (Arrow o C) liberan el GIL, el tiempo lo marca el archivo más lento
+    with ThreadPoolExecutor(max_workers=len(existentes)) as pool:
+        dfs = list(pool.map(lambda par: _cargar_censo(*par), existentes))
+    # Mismas categorías en todos los archivos: concat conserva el dtype category sin pasar por object
+    for col in ("entidad", "sector"):
+        if all(col in d.columns for d in dfs):
+            unidas = union_categoricals([d[col] for d in dfs], sort_categories=True).categories
+            for d in dfs:
+                d[col] = d[col].cat.set_categories(unidas)
     df = pd.concat(dfs, ignore_index=True)
-    # dtypes compactos
+    # Solo si algún archivo no traía la columna (concat la degrada a object)
     for col in ("entidad", "sector"):
-        if col in df.columns:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
             df[col] = df[col].astype("category")
-    if "personal_ocupado_estrato" in df.columns:
-        df["personal_ocupado_estrato"] = df["personal_ocupado_estrato"].astype("Int8")
-    if "censo" in df.columns:
-        df["censo"] = df["censo"].astype("Int16")
+    df = _ordenar_por_claves(df)
+    _escribir_parquet(df, firma)
+    df.attrs["sello"] = _sello(firma)
     return df
 
 
@@ -154,7 +382,7 @@ def cargar_probabilidades() -> pd.DataFrame:
     df.columns = [c.upper().strip().replace(" ", "_") for c in df.columns]
     for col in ("ENTIDAD", "SECTOR", "TAMAÑO"):
         if col in df.columns:
-            df[col] = df[col].astype(str).upper().str.strip()
+            df[col] = df[col].astype(str).str.upper().str.strip()
     # Mantener AÑO si existe
     return df
 
@@ -162,54 +390,201 @@ def cargar_probabilidades() -> pd.DataFrame:
 # Sidebar y filtros
 # -----------------------------------------------------------------------------
 
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _mapa_tamanos(_df: pd.DataFrame, sello: str) -> Dict[Tuple[str, str], Tuple[str, ...]]:
+    """Opciones de TAMAÑO por (entidad, sector), incluidas las combinaciones agregadas NACIONAL y
+    TODOS LOS SECTORES. Se construye una vez por carga de datos (`sello`, ver sello_datos); en
+    cada rerun basta una búsqueda en el dict.
+    """
+    ternas = _df[["entidad", "sector", "personal_ocupado_estrato"]].dropna().drop_duplicates()
+    ternas = ternas.astype({"entidad": str, "sector": str, "personal_ocupado_estrato": int})
+    # Las combinaciones agregadas se obtienen replicando las ternas con la clave comodín;
+    # un solo groupby produce los estratos de todas las claves
+    todas = pd.concat([
+        ternas,
+        ternas.assign(entidad="NACIONAL"),
+        ternas.assign(sector="TODOS LOS SECTORES"),
+        ternas.assign(entidad="NACIONAL", sector="TODOS LOS SECTORES"),
+    ], ignore_index=True)
+    estratos = todas.groupby(["entidad", "sector"], sort=False)["personal_ocupado_estrato"].unique()
+    # Pocas combinaciones distintas de estratos: cada una se arma una vez y todas las claves
+    # con los mismos estratos comparten el mismo objeto tupla
+    compartidas: Dict[Tuple[int, ...], Tuple[str, ...]] = {}
+    mapa = {}
+    for clave, nums in estratos.items():
+        firma = tuple(sorted(nums.tolist()))
+        etiquetas = compartidas.get(firma)
+        if etiquetas is None:
+            etiquetas = ("CONCENTRADOS",) + tuple(NUM_A_ETIQUETA_ESTRATO.get(e, f"Estrato {e}") for e in firma)
+            compartidas[firma] = etiquetas
+        mapa[clave] = etiquetas
+    return mapa
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _opciones_entidad_sector(_df: pd.DataFrame, sello: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Listas de ENTIDAD y SECTOR armadas una vez por carga de datos (`sello`), no en cada rerun."""
+    entidades = ("NACIONAL",) + tuple(sorted(_df["entidad"].cat.categories))
+    sectores = ("TODOS LOS SECTORES",) + tuple(sorted(_df["sector"].cat.categories))
+    return entidades, sectores
+
+
 def opciones_sidebar(df: pd.DataFrame) -> Tuple[str, str, Optional[str], str]:
-    entidades = ["NACIONAL"] + sorted(df["entidad"].cat.categories.tolist())
-    sectores = ["TODOS LOS SECTORES"] + sorted(df["sector"].cat.categories.tolist())
+    entidades, sectores = _opciones_entidad_sector(df, sello_datos(df))
 
     with st.sidebar:
         st.subheader("Filtros")
-        entidad = st.selectbox("ENTIDAD FEDERATIVA:", entidades)
-        sector = st.selectbox("SECTOR:", sectores)
-        # pre-filtrado para obtener estratos válidos
-        dff = df
-        if entidad != "NACIONAL":
-            dff = dff[dff["entidad"] == entidad]
-        if sector != "TODOS LOS SECTORES":
-            dff = dff[dff["sector"] == sector]
-        estratos_disponibles = sorted(dff["personal_ocupado_estrato"].dropna().unique().tolist())
-        etiquetas = ["CONCENTRADOS"] + [NUM_A_ETIQUETA_ESTRATO.get(int(e), f"Estrato {int(e)}") for e in estratos_disponibles]
-        tam = st.selectbox("TAMAÑO:", etiquetas)
+        entidad = st.selectbox("ENTIDAD FEDERATIVA:", entidades, key="sel_entidad")
+        sector = st.selectbox("SECTOR:", sectores, key="sel_sector")
+        # estratos válidos para la combinación: búsqueda O(1) en lugar de filtrar el DataFrame
+        etiquetas = _mapa_tamanos(df, sello_datos(df)).get((entidad, sector), ("CONCENTRADOS",))
+        # Clave por combinación: cada (entidad, sector) conserva su TAMAÑO elegido y sus opciones
+        # (tuplas del mapa cacheado) no cambian entre reruns
+        tam = st.selectbox("TAMAÑO:", etiquetas, key=f"tam_{entidad}_{sector}")
 
         st.subheader("Métricas")
         mostrar_ue = st.checkbox("Negocios", value=True, key="chk_ue")
         mostrar_po = st.checkbox("Empleos", value=False, key="chk_po")
 
-        fenomeno = st.radio("Fenómeno demográfico:", ["Población activa", "Natalidad", "Supervivencia"], horizontal=False)
+        fenomeno = st.radio("Fenómeno demográfico:", FENOMENOS, horizontal=False)
 
     return entidad, sector, tam, fenomeno
 
 
+def _mascara_categoria(s: pd.Series, valor: str) -> np.ndarray:
+    """Igualdad sobre los códigos enteros de la categoría (no compara cadenas fila por fila)."""
+    categorias = s.cat.categories
+    if valor not in categorias:
+        return np.zeros(len(s), dtype=bool)
+    return s.cat.codes.to_numpy() == categorias.get_loc(valor)
+
+
+def _corte_ordenado(df: pd.DataFrame, col: str, valor: str) -> pd.DataFrame:
+    """Filas con df[col] == valor cuando df está ordenado por col: búsqueda binaria sobre los códigos."""
+    categorias = df[col].cat.categories
+    if valor not in categorias:
+        return df.iloc[:0]
+    codigo = categorias.get_loc(valor)
+    i, j = np.searchsorted(df[col].cat.codes.to_numpy(), (codigo, codigo + 1))
+    return df.iloc[i:j]
+
+
 def aplicar_filtros(df: pd.DataFrame, entidad: str, sector: str, tam: Optional[str]) -> pd.DataFrame:
-    dff = df
+    """df viene de cargar_censos_unificado, ordenado por (entidad, sector, censo)."""
+    # Entidad y, dentro de ella, sector son cortes contiguos; el resto, una sola máscara combinada
+    mascara = None
     if entidad != "NACIONAL":
-        dff = dff[dff["entidad"] == entidad]
-    if sector != "TODOS LOS SECTORES":
-        dff = dff[dff["sector"] == sector]
+        df = _corte_ordenado(df, "entidad", entidad)
+        if sector != "TODOS LOS SECTORES":
+            df = _corte_ordenado(df, "sector", sector)
+    elif sector != "TODOS LOS SECTORES":
+        mascara = _mascara_categoria(df["sector"], sector)
     if tam and tam != "CONCENTRADOS":
-        estrato = ESTRATO_ETIQUETA_A_NUM.get(tam)
-        if estrato is not None:
-            if "y más" in tam:
-                dff = dff[dff["personal_ocupado_estrato"] >= estrato]
-            else:
-                dff = dff[dff["personal_ocupado_estrato"] == estrato]
-    return dff
+        meta = ESTRATO_FILTRO.get(tam)
+        if meta is not None:
+            estrato, abierto = meta
+            col = df["personal_ocupado_estrato"]
+            m = (col >= estrato) if abierto else (col == estrato)
+            m = m.to_numpy(dtype=bool, na_value=False)
+            mascara = m if mascara is None else mascara & m
+    return df if mascara is None else df[mascara]
+
+
+@st.cache_resource(show_spinner=False, max_entries=64)
+def filtrar_censos(_df: pd.DataFrame, sello: str, entidad: str, sector: str, tam: Optional[str]) -> pd.DataFrame:
+    """Subconjunto de la selección, memorizado por (sello, filtros) y compartido (de solo lectura)
+    entre reruns."""
+    return aplicar_filtros(_df, entidad, sector, tam)
 
 # -----------------------------------------------------------------------------
 # Pivotes / factores / series (comunes)
 # -----------------------------------------------------------------------------
 
+def _valor_o_cero(df: pd.DataFrame, col: str, fila: int) -> float:
+    """Lectura escalar posicional (NaN → 0.0) para búsquedas puntuales por año."""
+    val = df[col].iat[fila]
+    return 0.0 if pd.isna(val) else float(val)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _censos_de_columnas(columnas: Tuple[str, ...]) -> List[str]:
+    """Etiquetas 'CE yyyy' presentes en las columnas del pivote, ordenadas por año.
+    Extracción con una sola pasada regex vectorizada; np.unique ordena y quita duplicados
+    a la vez (al ser años de 4 dígitos, el orden lexicográfico coincide con el numérico).
+    """
+    censos = pd.Series(columnas, dtype="object").str.extract(r"^(CE \d{4})", expand=False)
+    return np.unique(censos.dropna().to_numpy(dtype=str)).tolist()
+
+
 @st.cache_data(show_spinner=False, max_entries=64)
-def pivot_demografia(dff: pd.DataFrame, incluir_ue: bool, incluir_po: bool) -> pd.DataFrame:
+def _columnas_por_metrica(columnas: Tuple[str, ...]) -> Dict[str, List[str]]:
+    """Agrupa en una sola pasada las columnas 'CE yyyy - UE/PO' por métrica, ordenadas por año."""
+    grupos: Dict[str, List[str]] = {"UE": [], "PO": []}
+    for c in sorted(columnas):
+        metrica = c.rsplit(" - ", 1)[-1]
+        if metrica in grupos:
+            grupos[metrica].append(c)
+    return grupos
+
+
+def _factores_consecutivos(vals: np.ndarray, raiz: float) -> np.ndarray:
+    """(siguiente/anterior)**raiz entre columnas consecutivas (último eje); NaN si anterior <= 0."""
+    prev = vals[..., :-1]
+    nxt = vals[..., 1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(prev > 0, (nxt / prev) ** raiz, np.nan)
+
+
+def _tasa_promedio(factores: Optional[pd.DataFrame], fila: str) -> float:
+    """Media de los factores anuales de una fila (NaN ignorados); 1.0 si no hay datos."""
+    if factores is None or factores.empty or fila not in factores.index:
+        return 1.0
+    vals = factores.loc[fila].to_numpy(dtype=float)
+    vals = vals[~np.isnan(vals)]
+    return float(vals.mean()) if vals.size else 1.0
+
+
+def _proyectar(base: float, tasas: np.ndarray) -> np.ndarray:
+    """Encadena tasas anuales sobre un valor base: base·cumprod(tasas), un valor por año."""
+    return base * np.cumprod(np.asarray(tasas, dtype=float))
+
+
+def _por_anio(df: pd.DataFrame) -> pd.DataFrame:
+    """Ordena por año (índice) solo si hace falta; en el caso común ya viene ordenado y no se copia."""
+    return df if df.index.is_monotonic_increasing else df.sort_index()
+
+
+def _interpolar_periodos(anios: List[int], valores: List[float], factores: List[float], anio_tope: int) -> Dict[int, float]:
+    """Serie {año: valor} entre censos: el valor de cada censo (salvo el último) y los años
+    intermedios de su periodo en forma cerrada valor·f^k, hasta anio_tope (exclusivo).
+    Compartida por UE y PO en todas las proyecciones.
+    """
+    serie: Dict[int, float] = {}
+    for i in range(len(anios) - 1):
+        a_i, a_f = anios[i], anios[i+1]
+        serie[a_i] = valores[i]
+        intermedios = np.arange(a_i+1, min(a_f, anio_tope))
+        serie.update(zip(intermedios.tolist(), (valores[i] * factores[i] ** (intermedios - a_i)).tolist()))
+    return serie
+
+
+def _fila_como_dict(df: Optional[pd.DataFrame], fila: str) -> Dict[str, float]:
+    """Fila de factores como dict {etiqueta: valor} para búsquedas O(1) dentro de los bucles."""
+    if df is None or df.empty or fila not in df.index:
+        return {}
+    return df.loc[fila].to_dict()
+
+
+def _anios_censo(censos: List[str]) -> np.ndarray:
+    """Años de las etiquetas 'CE yyyy[ - UE/PO]' en un arreglo, parseados una sola vez."""
+    return np.fromiter((int(c[3:7]) for c in censos), dtype=int, count=len(censos))
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def pivot_demografia(_dff: pd.DataFrame, filtros: Tuple[str, str, str, Optional[str]],
+                     incluir_ue: bool, incluir_po: bool) -> pd.DataFrame:
+    """`filtros` (sello de los datos, entidad, sector, tam) identifica a `_dff` en la caché: el
+    subconjunto no se hashea y un pivote nunca sobrevive a una recarga de los datos."""
     valores = []
     if incluir_ue:
         valores.append("ue")
@@ -217,18 +592,16 @@ def pivot_demografia(dff: pd.DataFrame, incluir_ue: bool, incluir_po: bool) -> p
         valores.append("po")
     if not valores:
         return pd.DataFrame()
-    agg = dff.groupby(["generacion", "censo"], observed=True)[valores].sum().unstack("censo", fill_value=0)
-    frames = []
-    for metrica in valores:
-        sub = agg[metrica]
-        sub.columns = [f"CE {int(c)} - {metrica.upper()}" for c in sub.columns]
-        frames.append(sub)
-    tabla = pd.concat(frames, axis=1)
-    tabla.index.name = "Año"
-    # fila totales (índice 0)
-    totales = pd.DataFrame([tabla.sum(axis=0)], index=[0])
-    tabla = pd.concat([tabla, totales])
-    return tabla
+    agg = _dff.groupby(["generacion", "censo"], observed=True)[valores].sum().unstack("censo", fill_value=0)
+    # Columnas (métrica, censo) ya vienen agrupadas por métrica: se aplanan sin partir ni concatenar
+    cuerpo = agg.to_numpy()
+    etiquetas = [f"CE {int(c)} - {m.upper()}" for m, c in agg.columns]
+    # fila totales (índice 0), sumada directamente sobre el bloque NumPy
+    return pd.DataFrame(
+        np.vstack([cuerpo, cuerpo.sum(axis=0)]),
+        index=agg.index.tolist() + [0],
+        columns=etiquetas,
+    )
 
 
 @st.cache_data(show_spinner=False, max_entries=256)
@@ -239,23 +612,22 @@ def factores_crecimiento_desde_totales(tabla: pd.DataFrame, raiz: float = 0.2) -
     if tabla.empty:
         return pd.DataFrame(), []
     totales = tabla.loc[0]
-    col_ue = [c for c in totales.index if c.endswith("UE")]
-    col_po = [c for c in totales.index if c.endswith("PO")]
-
-    def _calc(cols: List[str]) -> Tuple[List[float], List[str]]:
-        if not cols:
-            return [], []
-        pares = sorted(cols, key=lambda x: int(x.split(" ")[1]))
-        vals = totales[pares].to_numpy(dtype=float)
-        prev = vals[:-1]
-        nxt = vals[1:]
-        with np.errstate(divide='ignore', invalid='ignore'):
-            factores = np.where(prev > 0, (nxt / prev) ** raiz, np.nan)
+    grupos = _columnas_por_metrica(tuple(totales.index))
+
+    def _calc(pares: List[str]) -> Tuple[List[float], List[str], List[str]]:
+        if not pares:
+            return [], [], []
+        factores = _factores_consecutivos(totales[pares].to_numpy(dtype=float), raiz)
         etiquetas = [f"{pares[i]}-{pares[i+1]}" for i in range(len(pares)-1)]
-        return factores.tolist(), etiquetas
+        anios = _anios_censo(pares).tolist()
+        periodos = [f"{anios[i]}-{anios[i+1]}" for i in range(len(anios)-1)]
+        return factores.tolist(), etiquetas, periodos
 
-    f_ue, etiquetas = _calc(col_ue)
-    f_po, _ = _calc(col_po)
+    f_ue, etiquetas, periodos = _calc(grupos["UE"])
+    f_po, etiquetas_po, periodos_po = _calc(grupos["PO"])
+    if not f_ue:
+        # Solo PO seleccionado: las etiquetas de columna salen de sus censos
+        etiquetas, periodos = etiquetas_po, periodos_po
 
     filas, idx = [], []
     if f_ue:
@@ -264,7 +636,7 @@ def factores_crecimiento_desde_totales(tabla: pd.DataFrame, raiz: float = 0.2) -
         filas.append(f_po); idx.append("Personal Ocupado")
     if not filas:
         return pd.DataFrame(), etiquetas
-    df = pd.DataFrame(filas, index=idx, columns=[e.replace("CE ", "").replace(" - UE", "").replace(" - PO", "") for e in etiquetas])
+    df = pd.DataFrame(filas, index=idx, columns=periodos)
     return df, etiquetas
 
 
@@ -276,68 +648,45 @@ def serie_anual_desde_factores(tabla: pd.DataFrame, factores: pd.DataFrame) -> p
     if tabla.empty:
         return pd.DataFrame(columns=["Año", "Número de Negocios", "Personal Ocupado"])  
 
-    cols_ue = sorted([c for c in tabla.columns if c.endswith("UE")], key=lambda x: int(x.split(" ")[1]))
-    cols_po = sorted([c for c in tabla.columns if c.endswith("PO")], key=lambda x: int(x.split(" ")[1]))
+    grupos = _columnas_por_metrica(tuple(tabla.columns))
+    cols_ue, cols_po = grupos["UE"], grupos["PO"]
     tot = tabla.loc[0]
-    registros = []
-
-    # UE
-    for i in range(max(0, len(cols_ue)-1)):
-        a_i = int(cols_ue[i].split(" ")[1]); a_f = int(cols_ue[i+1].split(" ")[1])
-        val = float(tot[cols_ue[i]])
-        etiqueta = f"{a_i}-{a_f}"
-        f = float(factores.loc["Unidades Económicas", etiqueta]) if (not factores.empty and "Unidades Económicas" in factores.index and etiqueta in factores.columns) else 1.0
-        registros.append({"Año": a_i, "Número de Negocios": val})
-        for a in range(a_i+1, min(a_f, 2019)):
-            val *= f; registros.append({"Año": a, "Número de Negocios": val})
-
-    # PO
-    for i in range(max(0, len(cols_po)-1)):
-        a_i = int(cols_po[i].split(" ")[1]); a_f = int(cols_po[i+1].split(" ")[1])
-        val = float(tot[cols_po[i]])
-        etiqueta = f"{a_i}-{a_f}"
-        f = float(factores.loc["Personal Ocupado", etiqueta]) if (not factores.empty and "Personal Ocupado" in factores.index and etiqueta in factores.columns) else 1.0
-        registros.append({"Año": a_i, "Personal Ocupado": val})
-        for a in range(a_i+1, min(a_f, 2019)):
-            val *= f; registros.append({"Año": a, "Personal Ocupado": val})
-
-    df = pd.DataFrame(registros).groupby("Año", as_index=False).sum(numeric_only=True)
+    anios_ue, anios_po = _anios_censo(cols_ue).tolist(), _anios_censo(cols_po).tolist()
+    f_ue = _fila_como_dict(factores, "Unidades Económicas")
+    f_po = _fila_como_dict(factores, "Personal Ocupado")
+    filas: Dict[int, Dict[str, float]] = {}  # año → {columna: valor}; el DataFrame se construye una vez al final
+
+    for m, cols, anios, f_fila in (("Número de Negocios", cols_ue, anios_ue, f_ue), ("Personal Ocupado", cols_po, anios_po, f_po)):
+        f_periodos = [float(f_fila.get(f"{anios[i]}-{anios[i+1]}", 1.0)) for i in range(len(anios)-1)]
+        for a, v in _interpolar_periodos(anios, tot[cols].to_numpy(dtype=float).tolist(), f_periodos, 2019).items():
+            filas.setdefault(a, {})[m] = v
 
     # 2019 a partir de 2018
-    if not df.empty and (df["Año"] == 2018).any():
-        base_ue_2018 = float(df.loc[df["Año"]==2018, "Número de Negocios"].fillna(0).values[0]) if "Número de Negocios" in df.columns else np.nan
-        base_po_2018 = float(df.loc[df["Año"]==2018, "Personal Ocupado"].fillna(0).values[0]) if "Personal Ocupado" in df.columns else np.nan
-        # tasa promedio UE desde factores
-        if not factores.empty and "Unidades Económicas" in factores.index:
-            medias = pd.to_numeric(factores.loc["Unidades Económicas"], errors="coerce").dropna()
-            tasa_ue = float(medias.mean()) if not medias.empty else 1.0
-        else:
-            tasa_ue = 1.0
+    if 2018 in filas:
+        base_ue_2018 = filas[2018].get("Número de Negocios", np.nan)
+        base_po_2018 = filas[2018].get("Personal Ocupado", np.nan)
+        tasa_ue = _tasa_promedio(factores, "Unidades Económicas")
         if not math.isnan(base_ue_2018):
-            df = pd.concat([df, pd.DataFrame([{"Año": 2019, "Número de Negocios": base_ue_2018*tasa_ue}])], ignore_index=True)
+            filas.setdefault(2019, {})["Número de Negocios"] = base_ue_2018*tasa_ue
         if not math.isnan(base_po_2018):
-            df = pd.concat([df, pd.DataFrame([{"Año": 2019, "Personal Ocupado": base_po_2018*TASAS_IMSS[0]}])], ignore_index=True)
-        # 2020–2022 para PO
-        for idx, anio in enumerate([2020, 2021, 2022], start=1):
-            prev = df[df["Año"]==anio-1].iloc[:1]
-            if not prev.empty and "Personal Ocupado" in df.columns and not pd.isna(prev["Personal Ocupado"].values[0]):
-                po_val = float(prev["Personal Ocupado"].values[0]) * TASAS_IMSS[idx]
-                df = pd.concat([df, pd.DataFrame([{"Año": anio, "Personal Ocupado": po_val}])], ignore_index=True)
+            # 2019–2022 para PO: tasas IMSS encadenadas en un solo producto acumulado
+            for anio, po_val in zip(ANIOS_IMSS.tolist(), _proyectar(base_po_2018, TASAS_IMSS).tolist()):
+                filas.setdefault(anio, {})["Personal Ocupado"] = po_val
 
     # 2023 observación
     for m, suf in (("Número de Negocios", "UE"), ("Personal Ocupado", "PO")):
-        cols = [c for c in tabla.columns if c.startswith("CE 2023") and c.endswith(suf)]
-        if cols:
-            val = float(tabla.loc[0, cols[0]])
-            df = df[df["Año"] != 2023]
-            df = pd.concat([df, pd.DataFrame([{"Año": 2023, m: val}])], ignore_index=True)
-
-    if not df.empty:
-        df.sort_values("Año", inplace=True)
-        df.drop_duplicates("Año", keep="last", inplace=True)
-        for c in ("Número de Negocios", "Personal Ocupado"):
-            if c in df.columns:
-                df[c] = df[c].astype("float64")
+        col_2023 = f"CE 2023 - {suf}"
+        if col_2023 in grupos[suf]:
+            filas.setdefault(2023, {})[m] = float(tabla.at[0, col_2023])
+
+    if not filas:
+        return pd.DataFrame(columns=["Año", "Número de Negocios", "Personal Ocupado"])
+    df = _por_anio(pd.DataFrame.from_dict(filas, orient="index"))
+    df.index.name = "Año"
+    df = df.reset_index()
+    for c in ("Número de Negocios", "Personal Ocupado"):
+        if c in df.columns:
+            df[c] = df[c].astype("float64")
     return df
 
 # -----------------------------------------------------------------------------
@@ -353,21 +702,19 @@ def tabla_natalidad_desde_pivote(tabla_pivote: pd.DataFrame, pasos_fila: int = 5
     if tabla_pivote.empty:
         return pd.DataFrame()
     # columnas CE yyyy - UE/PO existentes
-    censos = sorted(list({c.split(" - ")[0] for c in tabla_pivote.columns if c.startswith("CE ")}))
-    datos = {"UE": {}, "PO": {}}
-    for i, censo in enumerate(censos):
-        fila = (i+1)*pasos_fila  # 5,10,15...
-        if fila < len(tabla_pivote):
-            col_ue = f"{censo} - UE"
-            col_po = f"{censo} - PO"
-            if col_ue in tabla_pivote.columns:
-                datos["UE"][censo] = float(tabla_pivote.iloc[fila][col_ue])
-            if col_po in tabla_pivote.columns:
-                datos["PO"][censo] = float(tabla_pivote.iloc[fila][col_po])
-        else:
-            datos["UE"][censo] = np.nan
-            datos["PO"][censo] = np.nan
-    df = pd.DataFrame(datos).T
+    censos = _censos_de_columnas(tuple(tabla_pivote.columns))
+    # Filas 5,10,15... por censo, extraídas de un solo bloque NumPy (NaN si la fila no existe)
+    filas = (np.arange(len(censos)) + 1) * pasos_fila
+    validas = filas < len(tabla_pivote)
+    bloque = tabla_pivote.to_numpy(dtype="float64")
+    pos_col = {c: j for j, c in enumerate(tabla_pivote.columns)}
+    valores = np.full((2, len(censos)), np.nan)
+    for r, metrica in enumerate(("UE", "PO")):
+        idx_col = np.array([pos_col.get(f"{c} - {metrica}", -1) for c in censos], dtype=int)
+        sel = validas & (idx_col >= 0)
+        valores[r, sel] = bloque[filas[sel], idx_col[sel]]
+    # Numérica desde el origen: las proyecciones leen celdas float64 con .at, sin reconvertir
+    df = pd.DataFrame(valores, index=["UE", "PO"], columns=censos)
     return df
 
 
@@ -376,19 +723,11 @@ def crecimiento_entre_censos_natalidad(tabla_np: pd.DataFrame, raiz: float = 0.2
     """Calcula factores entre censos para la tabla de natalidad (UE/PO), similar a totales."""
     if tabla_np.empty:
         return pd.DataFrame(), []
-    cols = sorted(tabla_np.columns, key=lambda x: int(x.split(" ")[1]))
-    def _calc(row: pd.Series):
-        vals = row[cols].to_numpy(dtype=float)
-        prev = vals[:-1]; nxt = vals[1:]
-        with np.errstate(divide='ignore', invalid='ignore'):
-            f = np.where(prev>0, (nxt/prev)**raiz, np.nan)
-        return f
+    cols = _censos_de_columnas(tuple(tabla_np.columns))
     etiquetas = [f"{cols[i]}-{cols[i+1]}" for i in range(len(cols)-1)]
-    out = {}
-    for idx in tabla_np.index:
-        out[idx] = _calc(tabla_np.loc[idx]).tolist()
-    df = pd.DataFrame(out, index=etiquetas).T
-    df.columns = etiquetas
+    # Todas las filas (UE/PO) en una sola operación vectorizada
+    factores = _factores_consecutivos(tabla_np[cols].to_numpy(dtype=float), raiz)
+    df = pd.DataFrame(factores, index=tabla_np.index, columns=etiquetas)
     return df, etiquetas
 
 
@@ -399,41 +738,26 @@ def proyeccion_natalidad(tabla_np: pd.DataFrame, crecimientos: pd.DataFrame, ani
     """
     if tabla_np.empty:
         return pd.DataFrame(columns=["Año", "Número de Nacimientos", "Nacimiento de Empleos"])  
-    cols = sorted(tabla_np.columns, key=lambda x: int(x.split(" ")[1]))
-    registros = []
-    # UE
-    if "UE" in tabla_np.index:
-        for i in range(max(0, len(cols)-1)):
-            a_i = int(cols[i].split(" ")[1]); a_f = int(cols[i+1].split(" ")[1])
-            val = float(tabla_np.loc["UE", cols[i]])
-            etiqueta = f"{cols[i]}-{cols[i+1]}"
-            f = float(crecimientos.loc["UE", etiqueta]) if (not crecimientos.empty and etiqueta in crecimientos.columns and "UE" in crecimientos.index) else 1.0
-            registros.append({"Año": a_i, "Número de Nacimientos": val})
-            for a in range(a_i+1, min(a_f, anio_tope)):
-                val *= f; registros.append({"Año": a, "Número de Nacimientos": val})
-    # PO
-    if "PO" in tabla_np.index:
-        for i in range(max(0, len(cols)-1)):
-            a_i = int(cols[i].split(" ")[1]); a_f = int(cols[i+1].split(" ")[1])
-            val = float(tabla_np.loc["PO", cols[i]])
-            etiqueta = f"{cols[i]}-{cols[i+1]}"
-            f = float(crecimientos.loc["PO", etiqueta]) if (not crecimientos.empty and etiqueta in crecimientos.columns and "PO" in crecimientos.index) else 1.0
-            registros.append({"Año": a_i, "Nacimiento de Empleos": val})
-            for a in range(a_i+1, min(a_f, anio_tope)):
-                val *= f; registros.append({"Año": a, "Nacimiento de Empleos": val})
-
-    df = pd.DataFrame(registros).groupby("Año", as_index=False).sum(numeric_only=True)
-    # Insertar 2023 (observación) si existe
-    for idx, col, target in (("UE", f"CE 2023", "Número de Nacimientos"), ("PO", f"CE 2023", "Nacimiento de Empleos")):
-        if idx in tabla_np.index and col in tabla_np.columns:
-            val = float(tabla_np.loc[idx, col])
-            df = df[df["Año"] != 2023]
-            df = pd.concat([df, pd.DataFrame([{"Año": 2023, target: val}])], ignore_index=True)
-
-    if not df.empty:
-        df.sort_values("Año", inplace=True)
-        df.drop_duplicates("Año", keep="last", inplace=True)
-    return df
+    cols = _censos_de_columnas(tuple(tabla_np.columns))
+    anios = _anios_censo(cols).tolist()
+    series: Dict[str, Dict[int, float]] = {}
+    for idx, target in (("UE", "Número de Nacimientos"), ("PO", "Nacimiento de Empleos")):
+        if idx in tabla_np.index:
+            crec = _fila_como_dict(crecimientos, idx)
+            f_periodos = [float(crec.get(f"{cols[i]}-{cols[i+1]}", 1.0)) for i in range(len(cols)-1)]
+            series[target] = _interpolar_periodos(anios, tabla_np.loc[idx, cols].to_numpy(dtype=float).tolist(), f_periodos, anio_tope)
+
+    # Años sin valor quedan en 0 (como la suma por año de la versión por registros)
+    df = pd.DataFrame(series).fillna(0.0)
+    # Observaciones 2023 reunidas en un dict y combinadas una sola vez (tienen prioridad)
+    extras: Dict[int, Dict[str, float]] = {}
+    for idx, target in (("UE", "Número de Nacimientos"), ("PO", "Nacimiento de Empleos")):
+        if idx in tabla_np.index and "CE 2023" in tabla_np.columns:
+            extras.setdefault(2023, {})[target] = float(tabla_np.at[idx, "CE 2023"])
+    if extras:
+        df = _por_anio(pd.DataFrame.from_dict(extras, orient="index").combine_first(df))
+    df = df.rename_axis("Año").reset_index()
+    return df.reindex(columns=["Año"] + [c for c in ("Número de Nacimientos", "Nacimiento de Empleos") if c in df.columns])
 
 # -----------------------------------------------------------------------------
 # SUPERVIVENCIA (optimizada y genérica para 5,10,15,20,25)
@@ -453,61 +777,40 @@ def proyeccion_supervivencia(tabla_sprv: pd.DataFrame, step: int, factores_ref:
     promedio de factores (si se provee), o 1.0 en su defecto. Similar a población activa, pero
     sobre la tabla de 'supervivientes después de X años'.
     """
+    col_ue = f"Supervivientes después de {step} años UE"
+    col_po = f"Supervivientes después de {step} años PO"
     if tabla_sprv.empty:
-        return pd.DataFrame(columns=["Año (t)", f"Supervivientes después de {step} años UE", f"Supervivientes después de {step} años PO"])  
+        return pd.DataFrame(columns=["Año (t)", col_ue, col_po])
 
-    cols = sorted(tabla_sprv.columns, key=lambda x: int(x.split(" ")[1]))
-    registros = []
+    cols = _censos_de_columnas(tuple(tabla_sprv.columns))
+    anios = _anios_censo(cols).tolist()
+    series: Dict[str, Dict[int, float]] = {}
 
-    # UE
+    # UE: la tasa de referencia es la misma para todos los periodos; se calcula una vez
     if "UE" in tabla_sprv.index:
-        for i in range(max(0, len(cols)-1)):
-            a_i = int(cols[i].split(" ")[1]); a_f = int(cols[i+1].split(" ")[1])
-            val = float(tabla_sprv.loc["UE", cols[i]])
-            tasa = 1.0
-            if factores_ref is not None and not factores_ref.empty and "Unidades Económicas" in factores_ref.index:
-                medias = pd.to_numeric(factores_ref.loc["Unidades Económicas"], errors="coerce").dropna()
-                if not medias.empty:
-                    tasa = float(medias.mean())
-            registros.append({"Año (t)": a_i, f"Supervivientes después de {step} años UE": val})
-            for a in range(a_i+1, min(a_f, 2019)):
-                val *= tasa; registros.append({"Año (t)": a, f"Supervivientes después de {step} años UE": val})
-
-    # PO
+        tasa = _tasa_promedio(factores_ref, "Unidades Económicas")
+        series[col_ue] = _interpolar_periodos(anios, tabla_sprv.loc["UE", cols].to_numpy(dtype=float).tolist(), [tasa] * (len(anios)-1), 2019)
+
+    # PO: solo los años censales; entre censos no se interpola (las tasas IMSS cubren 2019..2022)
     if "PO" in tabla_sprv.index:
-        for i in range(max(0, len(cols)-1)):
-            a_i = int(cols[i].split(" ")[1]); a_f = int(cols[i+1].split(" ")[1])
-            val = float(tabla_sprv.loc["PO", cols[i]])
-            registros.append({"Año (t)": a_i, f"Supervivientes después de {step} años PO": val})
-            for a in range(a_i+1, min(a_f, 2019)):
-                # Para PO usamos tasas IMSS año-a-año, aplicadas en cascada a partir del primer estimado
-                # (Aproximación consistente con tu app: IMSS para PO post-2019, aquí usamos 2019..2022)
-                # Entre censos previos a 2019 mantenemos val (o podríamos aplicar tasa UE ref si quieres).
-                pass
-
-    df = pd.DataFrame(registros).groupby("Año (t)", as_index=False).sum(numeric_only=True)
-    # Extensión 2019..2022 para PO
-    if not df.empty and (df["Año (t)"] == 2018).any() and f"Supervivientes después de {step} años PO" in df.columns:
-        base_po_2018 = float(df.loc[df["Año (t)"]==2018, f"Supervivientes después de {step} años PO"].fillna(0).values[0])
-        po_2019 = base_po_2018 * TASAS_IMSS[0]
-        df = pd.concat([df, pd.DataFrame([{"Año (t)": 2019, f"Supervivientes después de {step} años PO": po_2019}])], ignore_index=True)
-        prev = po_2019
-        for idx, anio in enumerate([2020, 2021, 2022], start=1):
-            prev = prev * TASAS_IMSS[idx]
-            df = pd.concat([df, pd.DataFrame([{"Año (t)": anio, f"Supervivientes después de {step} años PO": prev}])], ignore_index=True)
-
-    # Añadir 2023 observación si existe en tabla_sprv
-    for idx, target in (("UE", f"Supervivientes después de {step} años UE"), ("PO", f"Supervivientes después de {step} años PO")):
-        col = "CE 2023"
-        if idx in tabla_sprv.index and col in tabla_sprv.columns:
-            val = float(tabla_sprv.loc[idx, col])
-            df = df[df["Año (t)"] != 2023]
-            df = pd.concat([df, pd.DataFrame([{"Año (t)": 2023, target: val}])], ignore_index=True)
-
-    if not df.empty:
-        df.sort_values("Año (t)", inplace=True)
-        df.drop_duplicates("Año (t)", keep="last", inplace=True)
-    return df
+        series[col_po] = dict(zip(anios[:-1], tabla_sprv.loc["PO", cols[:-1]].to_numpy(dtype=float).tolist()))
+
+    # Una columna por métrica, construidas de una vez; un año sin la métrica (o NaN) vale 0
+    df = _por_anio(pd.DataFrame(series, dtype=float).fillna(0.0))
+    # Valores de frontera (PO 2019..2022 con tasas IMSS y observación 2023) en un dict;
+    # se combinan una sola vez y tienen prioridad sobre lo proyectado
+    extras: Dict[int, Dict[str, float]] = {}
+    if 2018 in df.index and col_po in df.columns:
+        base_po_2018 = _valor_o_cero(df, col_po, df.index.get_loc(2018))
+        for anio, po_val in zip(ANIOS_IMSS.tolist(), _proyectar(base_po_2018, TASAS_IMSS).tolist()):
+            extras.setdefault(anio, {})[col_po] = po_val
+    for idx, target in (("UE", col_ue), ("PO", col_po)):
+        if idx in tabla_sprv.index and "CE 2023" in tabla_sprv.columns:
+            extras.setdefault(2023, {})[target] = float(tabla_sprv.at[idx, "CE 2023"])
+    if extras:
+        df = _por_anio(pd.DataFrame.from_dict(extras, orient="index").combine_first(df))
+    df = df.rename_axis("Año (t)").reset_index()
+    return df.reindex(columns=["Año (t)"] + [c for c in (col_ue, col_po) if c in df.columns])
 
 # -----------------------------------------------------------------------------
 # Helpers de UI
@@ -534,6 +837,120 @@ def _titulo(entidad: str, sector: str, tam: str) -> Tuple[str, str, str]:
 def _note():
     st.markdown("<small>Fuente: Censos Económicos 1989-2024</small>", unsafe_allow_html=True)
 
+
+def _formato_miles(columnas: List[str]) -> Dict[str, Dict]:
+    """column_config con separador de miles y sin decimales; la tabla formatea solo las celdas
+    visibles en el navegador (sin Styler ni cadenas en Python) y los NaN quedan en blanco.
+    """
+    return {c: st.column_config.NumberColumn(format="%,.0f") for c in columnas}
+
+
+def _valores_grafica(s: pd.Series) -> np.ndarray:
+    """Valores Y de una traza: float32 solo si la conversión es exacta para toda la columna.
+    float32 representa enteros exactos hasta 2**24 (~16.7 M); los totales nacionales de personal
+    ocupado lo superan y el hover dejaría de coincidir con la tabla, así que quedan en float64.
+    """
+    valores = s.to_numpy(dtype="float64")
+    compactos = valores.astype("float32")
+    return compactos if np.array_equal(compactos, valores, equal_nan=True) else valores
+
+
+def _trazas_series(fig: go.Figure, df: pd.DataFrame, x: str, columnas: List[str],
+                   y_titulos: Optional[Dict[str, str]] = None, fila: int = 1) -> List[Dict]:
+    """Trazas (dicts) del panel `fila` de `fig`: la primera en el eje principal y la segunda en el
+    secundario. Colores (COLORES_SERIES) y títulos de eje van por nombre de columna; los títulos se fijan en `fig`.
+    """
+    y_titulos = y_titulos or {}
+    # Arreglos compactos para el JSON de Plotly: años int16; valores ver _valores_grafica
+    x_vals = df[x].to_numpy(dtype="int16")
+    trazas = []
+    for i, col in enumerate(columnas):
+        sec = i > 0
+        color = COLORES_SERIES.get(col, COLOR_PO)
+        ejes = fig.get_subplot(fila, 1, secondary_y=sec)
+        trazas.append(dict(
+            type="scattergl", x=x_vals, y=_valores_grafica(df[col]), name=col, mode="lines+markers",
+            line=dict(color=color), marker=dict(color=color), hovertemplate="%{y:,.0f}<br>Año: %{x}",
+            xaxis=ejes.xaxis.plotly_name.replace("axis", ""), yaxis=ejes.yaxis.plotly_name.replace("axis", ""),
+        ))
+        if col in y_titulos:
+            fig.update_yaxes(title_text=y_titulos[col], row=fila, col=1, secondary_y=sec)
+    return trazas
+
+
+def _figura_sin_validar(base: go.Figure, trazas: List[Dict]) -> go.Figure:
+    """Figura final a partir del layout de `base` (make_subplots) y trazas en dict, sin pasar por
+    los validadores de Plotly propiedad por propiedad.
+    `_validate` es un argumento privado de plotly (probado con la versión fijada en
+    requirements.txt, 6.3.0): si una versión futura lo retira, go.Figure lo rechaza con TypeError
+    y se construye la figura validada, más lenta pero equivalente.
+    """
+    layout = base.layout.to_plotly_json()
+    try:
+        return go.Figure(data=trazas, layout=layout, _validate=False)
+    except TypeError:
+        return go.Figure(data=trazas, layout=layout)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _figura_series(df: pd.DataFrame, x: str, columnas: List[str], titulo: str, x_titulo: str,
+                   y_titulos: Optional[Dict[str, str]] = None) -> go.Figure:
+    """Gráfico de líneas de un solo panel con eje secundario (ver `_trazas_series`).
+    Cacheado: en reruns con los mismos datos y filtros no se reconstruye la figura.
+    """
+    base = make_subplots(specs=[[{"secondary_y": True}]])
+    trazas = _trazas_series(base, df, x, columnas, y_titulos)
+    base.update_layout(title=dict(text=titulo, font=TITULO_FIG_FUENTE))
+    base.update_xaxes(title_text=x_titulo)
+    return _figura_sin_validar(base, trazas)
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def _figura_supervivencia(paneles: List[Tuple[int, pd.DataFrame, List[str]]], titulo: str) -> go.Figure:
+    """Un solo figure con un panel por horizonte (un payload y hover sincronizado en X). Cacheado."""
+    n = len(paneles)
+    base = make_subplots(
+        rows=n, cols=1, shared_xaxes=True, vertical_spacing=0.04,
+        specs=[[{"secondary_y": True}]] * n,
+        subplot_titles=[f"Nacidas {step} años antes" for step, _, _ in paneles],
+    )
+    trazas = []
+    for fila, (step, sprv, columnas) in enumerate(paneles, start=1):
+        trazas += _trazas_series(base, sprv, "Año (t)", columnas, fila=fila)
+    base.update_layout(title=dict(text=titulo, font=TITULO_FIG_FUENTE), height=300 * n + 150)
+    base.update_xaxes(title_text="Año (t)", row=n, col=1)
+    return _figura_sin_validar(base, trazas)
+
+
+def _figura_en_sesion(seccion: str, clave: Tuple, construir: Callable[[], go.Figure]) -> go.Figure:
+    """Figura de `seccion` guardada en st.session_state mientras `clave` (filtros y métricas) no cambie.
+    A diferencia de st.cache_data, no deserializa una copia en cada rerun.
+    """
+    figuras = st.session_state.setdefault("figuras", {})
+    guardada = figuras.get(seccion)
+    if guardada is None or guardada[0] != clave:
+        guardada = figuras[seccion] = (clave, construir())
+    return guardada[1]
+
+
+def _mostrar_serie_anual(df: pd.DataFrame, metricas: Dict[str, bool], titulo_tabla: str, titulo_fig: str,
+                         y_titulos: Dict[str, str], clave: Tuple) -> None:
+    """Tabla formateada y gráfica de una serie anual ('Año'). `metricas` va de UE a PO:
+    {columna: visible}; la primera visible se dibuja en el eje principal. `clave` identifica
+    los filtros para reutilizar la figura entre reruns.
+    """
+    st.write(titulo_tabla)
+    st.dataframe(df, width="stretch", height=600, hide_index=True,
+                 column_config=_formato_miles([c for c in metricas if c in df.columns]))
+    _note()
+
+    columnas = [c for c, visible in metricas.items() if visible and c in df.columns]
+    if columnas:
+        fig = _figura_en_sesion(next(iter(metricas)), clave, lambda: _figura_series(
+            df, "Año", columnas, titulo=titulo_fig, x_titulo="Año", y_titulos=y_titulos))
+        st.plotly_chart(fig, width="stretch")
+        _note()
+
 # -----------------------------------------------------------------------------
 # MAIN
 # -----------------------------------------------------------------------------
@@ -543,19 +960,31 @@ if df_all.empty:
     st.error("No se pudieron cargar los datos de censos. Asegúrate de subir los CSV al repositorio.")
     st.stop()
 
+sello = sello_datos(df_all)
 entidad, sector, tam, fenomeno = opciones_sidebar(df_all)
 mostrar_ue = st.session_state.get("chk_ue", True)
 mostrar_po = st.session_state.get("chk_po", False)
 
-df_f = aplicar_filtros(df_all, entidad, sector, tam)
+# Combinación sin registros (p. ej. un sector ausente en la entidad): prueba O(1) en las claves
+# del mapa de tamaños, sin filtrar el DataFrame
+if (entidad, sector) not in _mapa_tamanos(df_all, sello):
+    st.warning("No se encontraron datos para la combinación seleccionada.")
+    st.stop()
+
+df_f = filtrar_censos(df_all, sello, entidad, sector, tam)
 if df_f.empty:
     st.warning("No se encontraron datos para la combinación seleccionada.")
     st.stop()
 
 t_ent, t_sec, t_tam = _titulo(entidad, sector, tam)
+# Sufijos de título armados una vez por rerun (tablas en una línea, figuras con salto <br>)
+sufijo = f"{t_ent}, {t_sec} {t_tam}"
+sufijo_fig = f"{t_ent},<br>{t_sec} {t_tam}"
+# Incluye el sello: las figuras guardadas en sesión no sobreviven a una recarga de los datos
+clave_filtros = (sello, entidad, sector, tam, mostrar_ue, mostrar_po)
 
 # PIVOTE BASE
-tabla = pivot_demografia(df_f, mostrar_ue, mostrar_po)
+tabla = pivot_demografia(df_f, (sello, entidad, sector, tam), mostrar_ue, mostrar_po)
 if tabla.empty:
     st.info("Activa al menos una métrica (Negocios/Empleos) para ver resultados.")
     st.stop()
@@ -563,50 +992,21 @@ if tabla.empty:
 # ---------------------- POBLACIÓN ACTIVA ----------------------
 if fenomeno == "Población activa":
     with st.expander("Ver tabla pivote (resumen)"):
-        st.dataframe(tabla.head(100), width="stretch")
+        # Miles formateados en el navegador: el pivote numérico se envía tal cual, sin copia en texto
+        st.dataframe(tabla.head(100), width="stretch", column_config=_formato_miles(list(tabla.columns)))
         st.download_button("Descargar pivote CSV", data=tabla.to_csv().encode("utf-8"), file_name="pivote_demografia.csv", mime="text/csv")
 
     factores, etiquetas = factores_crecimiento_desde_totales(tabla, raiz=0.2)
     serie = serie_anual_desde_factores(tabla, factores)
 
     if not serie.empty:
-        serie_fmt = serie.copy()
-        for c in ("Número de Negocios", "Personal Ocupado"):
-            if c in serie_fmt.columns:
-                serie_fmt[c] = serie_fmt[c].round(0).map(lambda x: f"{int(x):,}" if pd.notnull(x) else "")
-        st.write(f"Comportamiento anual de población activa {t_ent}, {t_sec} {t_tam}")
-        st.dataframe(serie_fmt, width="stretch", height=600)
-        _note()
-
-    if not serie.empty:
-        columnas = []
-        if mostrar_ue and "Número de Negocios" in serie.columns:
-            columnas.append("Número de Negocios")
-        if mostrar_po and "Personal Ocupado" in serie.columns:
-            columnas.append("Personal Ocupado")
-        if columnas:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            for i, col in enumerate(columnas):
-                sec = i > 0
-                color = "#08989C" if col == "Número de Negocios" else "#003057"
-                fig.add_trace(
-                    go.Scatter(x=serie["Año"], y=serie[col], name=col, mode="lines+markers",
-                               line=dict(color=color), marker=dict(color=color), hovertemplate="%{y:,.0f}<br>Año: %{x}"),
-                    secondary_y=sec,
-                )
-            fig.update_layout(
-                hovermode="x unified",
-                title=dict(text=f"Comportamiento anual de población activa {t_ent},<br>{t_sec} {t_tam}", font=dict(size=15)),
-                legend=dict(x=0.5, xanchor="center", y=-0.2, yanchor="top", orientation="h"),
-                margin=dict(t=110),
-            )
-            fig.update_xaxes(title_text="Año")
-            if mostrar_ue:
-                fig.update_yaxes(title_text="<b>UNIDADES ECONÓMICAS</b>", secondary_y=False)
-            if mostrar_po:
-                fig.update_yaxes(title_text="<b>PERSONAL OCUPADO</b>", secondary_y=True)
-            st.plotly_chart(fig, width="stretch")
-            _note()
+        _mostrar_serie_anual(
+            serie, {"Número de Negocios": mostrar_ue, "Personal Ocupado": mostrar_po},
+            titulo_tabla=f"Comportamiento anual de población activa {sufijo}",
+            titulo_fig=f"Comportamiento anual de población activa {sufijo_fig}",
+            y_titulos={"Número de Negocios": "<b>UNIDADES ECONÓMICAS</b>", "Personal Ocupado": "<b>PERSONAL OCUPADO</b>"},
+            clave=clave_filtros,
+        )
 
 # ---------------------- NATALIDAD ----------------------
 if fenomeno == "Natalidad":
@@ -626,42 +1026,13 @@ if fenomeno == "Natalidad":
         st.download_button("Descargar natalidad CSV", data=tn.to_csv().encode("utf-8"), file_name="tabla_natalidad.csv", mime="text/csv")
 
     if not nat.empty:
-        nat_fmt = nat.copy()
-        for c in ("Número de Nacimientos", "Nacimiento de Empleos"):
-            if c in nat_fmt.columns:
-                nat_fmt[c] = nat_fmt[c].round(0).map(lambda x: f"{int(x):,}" if pd.notnull(x) else "")
-        st.write(f"Comportamiento anual de natalidad {t_ent}, {t_sec} {t_tam}")
-        st.dataframe(nat_fmt, width="stretch", height=600)
-        _note()
-
-        columnas = []
-        if mostrar_ue and "Número de Nacimientos" in nat.columns:
-            columnas.append("Número de Nacimientos")
-        if mostrar_po and "Nacimiento de Empleos" in nat.columns:
-            columnas.append("Nacimiento de Empleos")
-        if columnas:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            for i, col in enumerate(columnas):
-                sec = i > 0
-                color = "#08989C" if col == "Número de Nacimientos" else "#003057"
-                fig.add_trace(
-                    go.Scatter(x=nat["Año"], y=nat[col], name=col, mode="lines+markers",
-                               line=dict(color=color), marker=dict(color=color), hovertemplate="%{y:,.0f}<br>Año: %{x}"),
-                    secondary_y=sec,
-                )
-            fig.update_layout(
-                hovermode="x unified",
-                title=dict(text=f"Natalidad anual {t_ent},<br>{t_sec} {t_tam}", font=dict(size=15)),
-                legend=dict(x=0.5, xanchor="center", y=-0.2, yanchor="top", orientation="h"),
-                margin=dict(t=110),
-            )
-            fig.update_xaxes(title_text="Año")
-            if mostrar_ue:
-                fig.update_yaxes(title_text="<b>NACIMIENTOS DE NEGOCIOS</b>", secondary_y=False)
-            if mostrar_po:
-                fig.update_yaxes(title_text="<b>NACIMIENTOS DE EMPLEOS</b>", secondary_y=True)
-            st.plotly_chart(fig, width="stretch")
-            _note()
+        _mostrar_serie_anual(
+            nat, {"Número de Nacimientos": mostrar_ue, "Nacimiento de Empleos": mostrar_po},
+            titulo_tabla=f"Comportamiento anual de natalidad {sufijo}",
+            titulo_fig=f"Natalidad anual {sufijo_fig}",
+            y_titulos={"Número de Nacimientos": "<b>NACIMIENTOS DE NEGOCIOS</b>", "Nacimiento de Empleos": "<b>NACIMIENTOS DE EMPLEOS</b>"},
+            clave=clave_filtros,
+        )
 
 # ---------------------- SUPERVIVENCIA ----------------------
 if fenomeno == "Supervivencia":
@@ -670,6 +1041,7 @@ if fenomeno == "Supervivencia":
     factores_ref, _ = factores_crecimiento_desde_totales(tabla, raiz=0.2)
 
     steps = [5, 10, 15, 20, 25]
+    paneles = []  # (step, proyección, columnas) para la figura combinada
     for step in steps:
         st.markdown("---")
         st.subheader(f"Supervivencia a {step} años")
@@ -686,32 +1058,17 @@ if fenomeno == "Supervivencia":
             st.info("Sin datos para graficar.")
             continue
 
-        # Mostrar tabla formateada
-        sprv_fmt = sprv.copy()
-        for c in sprv_fmt.columns:
-            if c.startswith("Supervivientes después de"):
-                sprv_fmt[c] = sprv_fmt[c].round(0).map(lambda x: f"{int(x):,}" if pd.notnull(x) else "")
-        st.dataframe(sprv_fmt, width="stretch", height=500)
-        _note()
-
-        # Gráfico
+        # Mostrar tabla formateada (el formato lo aplica el navegador; los datos siguen numéricos)
         columnas = [c for c in sprv.columns if c.startswith("Supervivientes después de")]
+        st.dataframe(sprv, width="stretch", height=500, hide_index=True, column_config=_formato_miles(columnas))
+        _note()
         if columnas:
-            fig = make_subplots(specs=[[{"secondary_y": True}]])
-            for i, col in enumerate(columnas):
-                sec = i > 0
-                color = "#08989C" if " UE" in col else "#003057"
-                fig.add_trace(
-                    go.Scatter(x=sprv["Año (t)"], y=sprv[col], name=col, mode="lines+markers",
-                               line=dict(color=color), marker=dict(color=color), hovertemplate="%{y:,.0f}<br>Año: %{x}"),
-                    secondary_y=sec,
-                )
-            fig.update_layout(
-                hovermode="x unified",
-                title=dict(text=f"Supervivencia (t) nacidas {step} años antes {t_ent},<br>{t_sec} {t_tam}", font=dict(size=15)),
-                legend=dict(x=0.5, xanchor="center", y=-0.2, yanchor="top", orientation="h"),
-                margin=dict(t=110),
-            )
-            fig.update_xaxes(title_text="Año (t)")
-            st.plotly_chart(fig, width="stretch")
-            _note()
+            paneles.append((step, sprv, columnas))
+
+    # Gráfico: un solo figure con un panel por horizonte
+    if paneles:
+        st.markdown("---")
+        fig = _figura_en_sesion("Supervivencia", clave_filtros,
+                                lambda: _figura_supervivencia(paneles, f"Supervivencia (t) {sufijo_fig}"))
+        st.plotly_chart(fig, width="stretch")
+        _note()